@@ -11,6 +11,7 @@ Commands:
   /properties               - list all properties (basic info)
   /property <id>            - show single property details
   /complaints <property_id> - show complaints for a specific property
+  /refresh                  - (admins only) drop cached MockAPI data
 
 Environment variables:
   TELEGRAM_TOKEN        - required, your Telegram bot token from BotFather
@@ -20,18 +21,32 @@ Environment variables:
   MOCKAPI_KEY           - optional, API key/token to send to MockAPI
   MOCKAPI_KEY_HEADER    - optional, header name to send the key under (default: Authorization)
   MOCKAPI_KEY_PREFIX    - optional, prefix for token (default: Bearer). If you want raw token, set to empty string.
+  ADMIN_IDS             - optional, comma-separated Telegram user ids allowed to use /refresh
+  WEBHOOK_URL           - optional, public HTTPS base URL (e.g. https://mydomain); if set, the bot
+                          receives updates via webhook instead of long polling
+  WEBHOOK_LISTEN        - optional, address the webhook server binds to (default: 0.0.0.0)
+  WEBHOOK_PORT          - optional, port the webhook server listens on (default: 8443)
+  WEBHOOK_SECRET        - optional, secret token Telegram sends with every webhook request
 """
 
 import os
 import io
+import asyncio
+import time
+import functools
 import logging
-import requests
-import matplotlib
-matplotlib.use('Agg')  # Non-interactive backend for server use
-import matplotlib.pyplot as plt
+import threading
+from types import MappingProxyType
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import httpx
+import orjson
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg  # Non-interactive backend for server use
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Updater, CommandHandler, CallbackQueryHandler
-from typing import List, Dict, Tuple
+from telegram.ext import AIORateLimiter, Application, CommandHandler, CallbackQueryHandler
+from typing import Any, Awaitable, Callable, List, Dict, Mapping, NamedTuple, Tuple, Optional
 from dotenv import load_dotenv
 
 # Load .env file
@@ -45,10 +60,24 @@ COMPLAINTS_URL = os.getenv("COMPLAINTS_URL")  # e.g. https://yourproject.mockapi
 MOCKAPI_KEY = os.getenv("MOCKAPI_KEY")  # optional
 MOCKAPI_KEY_HEADER = os.getenv("MOCKAPI_KEY_HEADER", "Authorization")
 MOCKAPI_KEY_PREFIX = os.getenv("MOCKAPI_KEY_PREFIX", "Bearer")  # set "" for no prefix
+ADMIN_IDS = {int(x) for x in os.getenv("ADMIN_IDS", "").split(",") if x.strip()}  # optional
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # optional, e.g. https://mydomain
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")  # optional
 
 # Telegram message max length (safe limit)
 TELEGRAM_MAX_LEN = 4000
 
+# Max pooled connections to MockAPI, shared by all concurrent handlers
+MOCKAPI_POOL_SIZE = 32
+
+# Max complaints requested from MockAPI per property
+COMPLAINTS_LIMIT = 50
+
+# Number of rendered chart PNGs kept in memory
+CHART_CACHE_SIZE = 16
+
 # ---- Logging ----
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -58,7 +87,7 @@ if not TELEGRAM_TOKEN or not MOCKAPI_URL:
     raise SystemExit("Missing required environment variables.")
 
 
-def build_headers() -> Dict[str, str]:
+def _build_headers() -> Dict[str, str]:
     """Return headers to include in MockAPI requests, including optional auth."""
     headers = {
         "Accept": "application/json",
@@ -70,12 +99,72 @@ def build_headers() -> Dict[str, str]:
     return headers
 
 
-def fetch_all_properties() -> List[Dict]:
+# Headers sent with every MockAPI request. Built once at import (env vars don't change
+# at runtime); the proxy is the only reference to the dict, so it can't be mutated.
+HEADERS: Mapping[str, str] = MappingProxyType(_build_headers())
+
+
+# ---- HTTP client & chart workers ----
+# One shared httpx client (created in post_init, closed in post_shutdown) so MockAPI
+# calls reuse pooled keep-alive connections without blocking the event loop. HTTP/2 is
+# negotiated when the server offers it, letting concurrent GETs share one connection.
+MOCK_CLIENT: Optional[httpx.AsyncClient] = None
+# Chart rendering is CPU-bound, so it runs in worker processes off the event loop.
+EXECUTOR: Optional[ProcessPoolExecutor] = None
+
+
+async def post_init(application: Application) -> None:
+    """Create the shared MockAPI HTTP client and chart workers once the event loop is running."""
+    global MOCK_CLIENT, EXECUTOR
+    transport = httpx.AsyncHTTPTransport(
+        http2=True,
+        # Bounded pool: requests beyond MOCKAPI_POOL_SIZE wait for a free connection
+        # (up to the pool timeout) instead of opening throwaway ones
+        limits=httpx.Limits(max_connections=MOCKAPI_POOL_SIZE, max_keepalive_connections=MOCKAPI_POOL_SIZE),
+        retries=2,  # retry failed connection attempts
+    )
+    MOCK_CLIENT = httpx.AsyncClient(transport=transport, headers=HEADERS, timeout=10)
+    EXECUTOR = ProcessPoolExecutor(max_workers=2)
+
+
+async def post_shutdown(application: Application) -> None:
+    """Close the shared MockAPI HTTP client and stop the chart workers."""
+    if MOCK_CLIENT is not None:
+        await MOCK_CLIENT.aclose()
+    if EXECUTOR is not None:
+        EXECUTOR.shutdown(wait=False, cancel_futures=True)
+
+
+# ---- Response cache ----
+# MockAPI data barely changes between clicks, so fetches are memoized for a short
+# time. Keys are "<function name><args>", values are (monotonic timestamp, result).
+_CACHE: Dict[str, Tuple[float, Any]] = {}
+
+
+def ttl_cache(ttl: float) -> Callable:
+    """Cache the result of an async fetch function for `ttl` seconds (empty results are not cached)."""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(*args):
+            key = func.__name__ + repr(args)
+            hit = _CACHE.get(key)
+            if hit is not None and time.monotonic() - hit[0] < ttl:
+                return hit[1]
+            result = await func(*args)
+            if result:
+                _CACHE[key] = (time.monotonic(), result)
+            return result
+        return wrapper
+    return decorator
+
+
+@ttl_cache(60)
+async def fetch_all_properties() -> List[Dict]:
     """Fetch all properties from the base MOCKAPI_URL (expects a list)."""
     try:
-        resp = requests.get(MOCKAPI_URL, headers=build_headers(), timeout=10)
+        resp = await MOCK_CLIENT.get(MOCKAPI_URL)
         resp.raise_for_status()
-        data = resp.json()
+        data = orjson.loads(resp.content)
         if isinstance(data, list):
             return data
         # some mock APIs wrap result: { "data": [...] }
@@ -88,16 +177,32 @@ def fetch_all_properties() -> List[Dict]:
         return []
 
 
-def fetch_property_by_id(property_id: str) -> Dict:
+# Table built from the last properties list; rebuilt only when fetch_all_properties
+# returns a different list object, so it expires together with that list's TTL entry.
+_RATINGS_TABLE: Optional["RatingsTable"] = None
+
+
+async def fetch_ratings_table() -> Optional["RatingsTable"]:
+    """Fetch all properties and parse their ratings into a RatingsTable (None if no data)."""
+    global _RATINGS_TABLE
+    props = await fetch_all_properties()
+    if not props:
+        return None
+    if _RATINGS_TABLE is None or _RATINGS_TABLE.props is not props:
+        _RATINGS_TABLE = build_ratings_table(props)
+    return _RATINGS_TABLE
+
+
+async def fetch_property_by_id(property_id: str) -> Dict:
     """Try to fetch a single property via {MOCKAPI_URL}/{id}. If not available, fallback to list filter."""
     try:
         # Try fetching /properties/{id} first
         single_url = MOCKAPI_URL.rstrip("/") + "/" + property_id
-        resp = requests.get(single_url, headers=build_headers(), timeout=10)
+        resp = await MOCK_CLIENT.get(single_url)
         if resp.status_code == 200:
-            return resp.json()
+            return orjson.loads(resp.content)
         # If that failed, try searching the list for id
-        all_props = fetch_all_properties()
+        all_props = await fetch_all_properties()
         for p in all_props:
             # MockAPI typically uses "id" as string
             if str(p.get("id")) == str(property_id):
@@ -108,13 +213,14 @@ def fetch_property_by_id(property_id: str) -> Dict:
         return {}
 
 
-def fetch_properties_list() -> List[Dict]:
+@ttl_cache(60)
+async def fetch_properties_list() -> List[Dict]:
     """Fetch properties from PROPERTIES_URL (can be different from ratings endpoint)."""
     url = PROPERTIES_URL or MOCKAPI_URL
     try:
-        resp = requests.get(url, headers=build_headers(), timeout=10)
+        resp = await MOCK_CLIENT.get(url)
         resp.raise_for_status()
-        data = resp.json()
+        data = orjson.loads(resp.content)
         if isinstance(data, list):
             return data
         if isinstance(data, dict) and "data" in data and isinstance(data["data"], list):
@@ -125,21 +231,23 @@ def fetch_properties_list() -> List[Dict]:
         return []
 
 
-def fetch_complaints_for_property(property_id: str) -> List[Dict]:
+@ttl_cache(30)
+async def fetch_complaints_for_property(property_id: str) -> List[Dict]:
     """Fetch complaints for a specific property from COMPLAINTS_URL."""
     if not COMPLAINTS_URL:
         return []
     try:
-        # Try query param filter first: /complaints?property_id=X
-        url_with_filter = f"{COMPLAINTS_URL.rstrip('/')}?property_id={property_id}"
-        resp = requests.get(url_with_filter, headers=build_headers(), timeout=10)
+        # Ask the server to filter (/complaints?property_id=X) and cap the payload size
+        params = {"property_id": property_id, "limit": COMPLAINTS_LIMIT}
+        resp = await MOCK_CLIENT.get(COMPLAINTS_URL.rstrip('/'), params=params)
         resp.raise_for_status()
-        data = resp.json()
-        if isinstance(data, list):
-            return data
+        data = orjson.loads(resp.content)
         if isinstance(data, dict) and "data" in data:
-            return data["data"]
-        return []
+            data = data["data"]
+        if not isinstance(data, list):
+            return []
+        # Safety net in case the endpoint ignores the filter and returns every complaint
+        return [c for c in data if str(c.get("property_id")) == str(property_id)]
     except Exception as e:
         logger.exception("Failed to fetch complaints for property %s: %s", property_id, e)
         return []
@@ -147,17 +255,20 @@ def fetch_complaints_for_property(property_id: str) -> List[Dict]:
 
 def format_property(p: Dict) -> str:
     """Return a nicely formatted string for one property (safe keys)."""
-    name = p.get("name", "Unnamed property")
-    airbnb = p.get("airbnb_rating", p.get("airbnb", "N/A"))
-    booking = p.get("booking_rating", p.get("booking", "N/A"))
-    pid = p.get("id", "N/A")
-    extra = []
+    g = p.get
+    name = g("name", "Unnamed property")
+    airbnb = g("airbnb_rating", g("airbnb", "N/A"))
+    booking = g("booking_rating", g("booking", "N/A"))
+    pid = g("id", "N/A")
+    extras = ""
     # Include any other useful fields if present
-    if "location" in p:
-        extra.append(f"Location: {p['location']}")
-    if "url" in p:
-        extra.append(f"URL: {p['url']}")
-    extras = ("\n    " + "\n    ".join(extra)) if extra else ""
+    if "location" in p or "url" in p:
+        extra = []
+        if "location" in p:
+            extra.append(f"Location: {p['location']}")
+        if "url" in p:
+            extra.append(f"URL: {p['url']}")
+        extras = "\n    " + "\n    ".join(extra)
     return f"🏠 {name} (id: {pid})\n   ⭐ Airbnb: {airbnb}\n   ⭐ Booking: {booking}{extras}\n"
 
 
@@ -189,86 +300,123 @@ def format_complaint(c: Dict) -> str:
     return "\n".join(lines)
 
 
-def get_property_rating(p: Dict) -> float:
-    """Calculate average rating from Airbnb and Booking ratings."""
-    airbnb = p.get("airbnb_rating", p.get("airbnb"))
-    booking = p.get("booking_rating", p.get("booking"))
-
-    ratings = []
-    for r in [airbnb, booking]:
-        if r is not None:
-            try:
-                ratings.append(float(r))
-            except (ValueError, TypeError):
-                pass
-
-    if not ratings:
-        return 0.0
-    return sum(ratings) / len(ratings)
-
-
-def get_top_rated_properties(properties: List[Dict], limit: int) -> List[Tuple[Dict, float]]:
-    """Return top N properties sorted by average rating."""
-    rated = [(p, get_property_rating(p)) for p in properties]
-    rated.sort(key=lambda x: x[1], reverse=True)
-    return rated[:limit]
-
-
-def generate_ratings_chart(properties: List[Tuple[Dict, float]], title: str) -> io.BytesIO:
-    """Generate a horizontal bar chart of property ratings and return as bytes buffer."""
-    # Prepare data
-    names = []
-    airbnb_ratings = []
-    booking_ratings = []
-
-    for p, _ in properties:
-        name = p.get("name", "Unknown")
-        # Truncate long names
-        if len(name) > 20:
-            name = name[:17] + "..."
-        names.append(name)
-
-        airbnb = p.get("airbnb_rating", p.get("airbnb"))
-        booking = p.get("booking_rating", p.get("booking"))
-
-        try:
-            airbnb_ratings.append(float(airbnb) if airbnb else 0)
-        except (ValueError, TypeError):
-            airbnb_ratings.append(0)
-
-        try:
-            booking_ratings.append(float(booking) if booking else 0)
-        except (ValueError, TypeError):
-            booking_ratings.append(0)
-
-    # Create figure
+def _parse_rating(value) -> Optional[float]:
+    """Convert a raw rating value to float, or None if missing/invalid."""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+
+class RatingsTable(NamedTuple):
+    """Properties with their ratings as parallel arrays (row i of each array belongs to props[i]).
+
+    airbnb/booking are NaN where the rating is missing or invalid; avg is the mean of the
+    ratings present (0.0 if neither is).
+    """
+    props: List[Dict]
+    airbnb: np.ndarray
+    booking: np.ndarray
+    avg: np.ndarray
+
+    def take(self, idx: np.ndarray) -> "RatingsTable":
+        """Return a new table containing only the rows in `idx`, in that order."""
+        return RatingsTable([self.props[i] for i in idx], self.airbnb[idx], self.booking[idx], self.avg[idx])
+
+
+def build_ratings_table(props: List[Dict]) -> RatingsTable:
+    """Parse Airbnb/Booking ratings of all properties in one pass and compute averages vectorized."""
+    n = len(props)
+    airbnb = np.full(n, np.nan)
+    booking = np.full(n, np.nan)
+    for i, p in enumerate(props):
+        a = _parse_rating(p.get("airbnb_rating", p.get("airbnb")))
+        b = _parse_rating(p.get("booking_rating", p.get("booking")))
+        if a is not None:
+            airbnb[i] = a
+        if b is not None:
+            booking[i] = b
+    both = np.stack([airbnb, booking])
+    counts = np.count_nonzero(~np.isnan(both), axis=0)
+    avg = np.divide(np.nansum(both, axis=0), counts, out=np.zeros(n), where=counts > 0)
+    return RatingsTable(props, airbnb, booking, avg)
+
+
+def get_top_rated_properties(table: RatingsTable, limit: int) -> RatingsTable:
+    """Return the top N rows sorted by average rating, ties kept in list order.
+
+    argpartition finds the cutoff rating; every row at or above it is then stable-sorted,
+    so only those candidates (not the whole table) are sorted.
+    """
+    n = len(table.props)
+    limit = max(0, min(limit, n))
+    if limit == 0:
+        return table.take(np.arange(0))
+    if limit < n:
+        cutoff = table.avg[np.argpartition(-table.avg, limit - 1)[limit - 1]]
+        # All rows tied at the cutoff are candidates, so the stable sort decides among them
+        idx = np.flatnonzero(table.avg >= cutoff)
+    else:
+        idx = np.arange(n)
+    idx = idx[np.argsort(-table.avg[idx], kind="stable")][:limit]
+    return table.take(idx)
+
+
+# A single Figure/Axes reused for every chart render (per worker process) instead of
+# allocating a new figure each time. Matplotlib is not thread-safe, so renders hold _CHART_LOCK.
+# Drawn through the Agg canvas directly, bypassing the pyplot state machine.
+_FIG = Figure(figsize=(10, 6), dpi=100)
+_CANVAS = FigureCanvasAgg(_FIG)
+_AX = _FIG.add_subplot(111)
+# Fixed margins instead of tight_layout/bbox_inches='tight', which cost an extra layout pass
+_FIG.subplots_adjust(left=0.25, right=0.95, top=0.92, bottom=0.08)
+_CHART_LOCK = threading.Lock()
+
+
+def _truncate_name(name: str) -> str:
+    """Shorten long property names so chart labels stay readable."""
+    return name if len(name) <= 20 else name[:17] + "..."
+
+
+def generate_ratings_chart(names: List[str], airbnb_ratings: np.ndarray, booking_ratings: np.ndarray,
+                           title: str) -> bytes:
+    """Generate a horizontal bar chart of property ratings and return it as PNG bytes.
+
+    Missing ratings (NaN) are drawn as empty bars.
+    """
+    names = [_truncate_name(name) for name in names]
+    airbnb_ratings = np.nan_to_num(airbnb_ratings)
+    booking_ratings = np.nan_to_num(booking_ratings)
+
+    with _CHART_LOCK:
+        return _render_chart(names, airbnb_ratings, booking_ratings, title)
+
+
+def _render_chart(names: List[str], airbnb_ratings: np.ndarray, booking_ratings: np.ndarray, title: str) -> bytes:
+    """Draw the ratings chart on the shared figure and return PNG bytes (caller holds _CHART_LOCK)."""
+    ax = _AX
+    ax.clear()
     fig_height = max(6, len(names) * 0.5)
-    fig, ax = plt.subplots(figsize=(10, fig_height))
+    _FIG.set_size_inches(10, fig_height)
 
-    y_pos = range(len(names))
+    y_pos = np.arange(len(names))
     bar_height = 0.35
 
     # Create horizontal bars
-    bars1 = ax.barh([y - bar_height/2 for y in y_pos], airbnb_ratings,
+    bars1 = ax.barh(y_pos - bar_height/2, airbnb_ratings,
                     bar_height, label='Airbnb', color='#FF5A5F')
-    bars2 = ax.barh([y + bar_height/2 for y in y_pos], booking_ratings,
+    bars2 = ax.barh(y_pos + bar_height/2, booking_ratings,
                     bar_height, label='Booking', color='#003580')
 
-    # Add value labels on bars
-    for bar in bars1:
-        width = bar.get_width()
-        if width > 0:
-            ax.text(width + 0.05, bar.get_y() + bar.get_height()/2,
-                    f'{width:.1f}', va='center', fontsize=9)
-
-    for bar in bars2:
-        width = bar.get_width()
-        if width > 0:
-            ax.text(width + 0.05, bar.get_y() + bar.get_height()/2,
-                    f'{width:.1f}', va='center', fontsize=9)
+    # Add value labels on bars (blank for missing ratings)
+    for bars, ratings in ((bars1, airbnb_ratings), (bars2, booking_ratings)):
+        ax.bar_label(bars, labels=[f'{r:.1f}' if r > 0 else '' for r in ratings],
+                     padding=3, fontsize=9)
 
     # Customize chart
-    ax.set_yticks(list(y_pos))
+    ax.set_yticks(y_pos)
     ax.set_yticklabels(names)
     ax.invert_yaxis()  # Top property at the top
     ax.set_xlabel('Rating')
@@ -277,15 +425,36 @@ def generate_ratings_chart(properties: List[Tuple[Dict, float]], title: str) ->
     ax.set_xlim(0, 5.5)  # Ratings typically 0-5
     ax.grid(axis='x', alpha=0.3)
 
-    plt.tight_layout()
-
     # Save to buffer
     buf = io.BytesIO()
-    plt.savefig(buf, format='png', dpi=150, bbox_inches='tight')
-    buf.seek(0)
-    plt.close(fig)
+    _CANVAS.print_png(buf)
 
-    return buf
+    return buf.getvalue()
+
+
+# Rendered chart PNGs keyed on (title, plotted rows), least recently used evicted first.
+# The key holds everything drawn, so fresh data after a cache refresh gets a new entry.
+_CHART_CACHE: "OrderedDict[tuple, bytes]" = OrderedDict()
+
+
+async def get_ratings_chart(table: RatingsTable, title: str) -> bytes:
+    """Return the ratings chart PNG, rendering it in EXECUTOR only if this exact chart isn't cached."""
+    names = [p.get("name", "Unknown") for p in table.props]
+    # NaN != NaN, so key on zero-filled ratings to keep keys comparable
+    airbnb = np.nan_to_num(table.airbnb)
+    booking = np.nan_to_num(table.booking)
+    ids = [p.get("id") for p in table.props]
+    key = (title, tuple(zip(ids, names, airbnb.tolist(), booking.tolist())))
+    png = _CHART_CACHE.get(key)
+    if png is not None:
+        _CHART_CACHE.move_to_end(key)
+        return png
+    loop = asyncio.get_running_loop()
+    png = await loop.run_in_executor(EXECUTOR, generate_ratings_chart, names, airbnb, booking, title)
+    _CHART_CACHE[key] = png
+    if len(_CHART_CACHE) > CHART_CACHE_SIZE:
+        _CHART_CACHE.popitem(last=False)
+    return png
 
 
 def format_top_property(rank: int, p: Dict, avg_rating: float) -> str:
@@ -298,15 +467,17 @@ def format_top_property(rank: int, p: Dict, avg_rating: float) -> str:
     return f"{medal} {name} (id: {pid})\n   ⭐ Avg: {avg_rating:.2f} | Airbnb: {airbnb} | Booking: {booking}"
 
 
-def split_and_send(chat, text: str):
-    """Split long text into chunks and send sequentially (chat is telegram.Bot or update.message.reply_text)."""
+async def split_and_send(chat, text: str):
+    """Split long text into chunks and send them in order (chat is telegram.Bot or update.message.reply_text).
+
+    Chunks are sent one after another so they can't arrive out of order; the
+    application's AIORateLimiter keeps all outgoing calls within Telegram's limits.
+    """
     # If chat is update.message, the .reply_text method exists. We'll accept either:
     send_fn = chat.reply_text if hasattr(chat, "reply_text") else chat.send_message
-    start = 0
-    while start < len(text):
-        chunk = text[start:start + TELEGRAM_MAX_LEN]
-        send_fn(chunk)
-        start += TELEGRAM_MAX_LEN
+    chunks = [text[i:i + TELEGRAM_MAX_LEN] for i in range(0, len(text), TELEGRAM_MAX_LEN)]
+    for chunk in chunks:
+        await send_fn(chunk)
 
 
 # ---- Menu keyboard ----
@@ -329,8 +500,102 @@ def get_main_menu_keyboard():
     return InlineKeyboardMarkup(keyboard)
 
 
+# ---- Shared replies ----
+# Each takes the message to reply to, so commands (update.message) and menu buttons
+# (query.message) share one code path.
+async def _do_ratings(message):
+    await message.chat.send_action("typing")
+    props = await fetch_all_properties()
+    if not props:
+        await message.reply_text("No property data available (check MOCKAPI_URL or network).")
+        return
+
+    text = "🏡 Property Ratings (MockAPI) \n\n" + "\n".join(format_property(p) for p in props)
+    # split & send so we don't exceed Telegram limits
+    await split_and_send(message, text)
+
+
+async def _do_top_rated(message, limit: int):
+    """Send the top `limit` rated properties (or all if fewer) with a chart."""
+    await message.chat.send_action("typing")
+    table = await fetch_ratings_table()
+    if table is None:
+        await message.reply_text("No property data available.")
+        return
+
+    limit = min(limit, len(table.props))
+    top_props = get_top_rated_properties(table, limit)
+    if not top_props.props:
+        await message.reply_text("Could not calculate ratings.")
+        return
+
+    # Send text summary
+    text = f"🏆 Top {limit} Best Rated Properties\n\n" + "\n".join(
+        format_top_property(rank, p, avg) for rank, (p, avg) in enumerate(zip(top_props.props, top_props.avg), 1)
+    )
+    await split_and_send(message, text)
+
+    # Generate and send chart
+    await message.chat.send_action("upload_photo")
+    chart_png = await get_ratings_chart(top_props, f"Top {limit} Properties - Ratings Comparison")
+    await message.reply_photo(photo=chart_png, caption=f"📊 Top {limit} Properties Rating Chart")
+
+
+async def _do_top5(message):
+    await _do_top_rated(message, 5)
+
+
+async def _do_top20(message):
+    await _do_top_rated(message, 20)
+
+
+async def _do_properties(message):
+    await message.chat.send_action("typing")
+    props = await fetch_properties_list()
+    if not props:
+        await message.reply_text("No properties available.")
+        return
+
+    text = (
+        "🏠 Properties List\n\n"
+        + "\n".join(format_property_basic(p) for p in props)
+        + "\n\n💡 Use /property <id> for details"
+        + "\n💡 Use /complaints <id> to see complaints"
+    )
+    await split_and_send(message, text)
+
+
+async def _do_property_help(message):
+    await message.reply_text(
+        "🔍 Property Details\n\n"
+        "To view details for a specific property, use:\n"
+        "/property <id>\n\n"
+        "Example: /property 1"
+    )
+
+
+async def _do_complaints_help(message):
+    await message.reply_text(
+        "📋 View Complaints\n\n"
+        "To see complaints for a specific property, use:\n"
+        "/complaints <property_id>\n\n"
+        "Example: /complaints 1"
+    )
+
+
+# Inline keyboard callback_data -> reply coroutine
+CALLBACK_ACTIONS: Dict[str, Callable[..., Awaitable[None]]] = {
+    "action_top5": _do_top5,
+    "action_top20": _do_top20,
+    "action_ratings": _do_ratings,
+    "action_properties": _do_properties,
+    "action_property_help": _do_property_help,
+    "action_complaints_help": _do_complaints_help,
+}
+
+
 # ---- Telegram handlers ----
-def start(update, context):
+async def start(update, context):
     welcome_message = (
         "👋 Welcome to the Property Management Bot!\n\n"
         "I can help you with:\n"
@@ -339,123 +604,55 @@ def start(update, context):
         "• Check complaints for any property\n\n"
         "Use the menu below or type commands directly:"
     )
-    update.message.reply_text(welcome_message, reply_markup=get_main_menu_keyboard())
+    await update.message.reply_text(welcome_message, reply_markup=get_main_menu_keyboard())
 
 
-def menu_handler(update, context):
+async def menu_handler(update, context):
     """Show the main menu."""
-    update.message.reply_text(
+    await update.message.reply_text(
         "📌 Main Menu\n\nChoose an option below:",
         reply_markup=get_main_menu_keyboard()
     )
 
 
-def ratings_handler(update, context):
-    update.message.chat.send_action("typing")
-    props = fetch_all_properties()
-    if not props:
-        update.message.reply_text("No property data available (check MOCKAPI_URL or network).")
-        return
-
-    lines = ["🏡 Property Ratings (MockAPI) \n"]
-    for p in props:
-        lines.append(format_property(p))
-
-    message = "\n".join(lines)
-    # split & send so we don't exceed Telegram limits
-    split_and_send(update.message, message)
+async def ratings_handler(update, context):
+    await _do_ratings(update.message)
 
 
-def top5_handler(update, context):
+async def top5_handler(update, context):
     """Show top 5 rated properties with chart."""
-    update.message.chat.send_action("typing")
-    props = fetch_all_properties()
-    if not props:
-        update.message.reply_text("No property data available.")
-        return
-
-    top_props = get_top_rated_properties(props, 5)
-    if not top_props:
-        update.message.reply_text("Could not calculate ratings.")
-        return
-
-    # Send text summary
-    lines = ["🏆 Top 5 Best Rated Properties\n"]
-    for rank, (p, avg) in enumerate(top_props, 1):
-        lines.append(format_top_property(rank, p, avg))
-    update.message.reply_text("\n".join(lines))
-
-    # Generate and send chart
-    update.message.chat.send_action("upload_photo")
-    chart_buf = generate_ratings_chart(top_props, "Top 5 Properties - Ratings Comparison")
-    update.message.reply_photo(photo=chart_buf, caption="📊 Top 5 Properties Rating Chart")
+    await _do_top5(update.message)
 
 
-def top20_handler(update, context):
+async def top20_handler(update, context):
     """Show top 20 rated properties with chart."""
-    update.message.chat.send_action("typing")
-    props = fetch_all_properties()
-    if not props:
-        update.message.reply_text("No property data available.")
-        return
-
-    # Get top 20 (or all if less than 20)
-    limit = min(20, len(props))
-    top_props = get_top_rated_properties(props, limit)
-    if not top_props:
-        update.message.reply_text("Could not calculate ratings.")
-        return
-
-    # Send text summary
-    lines = [f"🏆 Top {limit} Best Rated Properties\n"]
-    for rank, (p, avg) in enumerate(top_props, 1):
-        lines.append(format_top_property(rank, p, avg))
-    message = "\n".join(lines)
-    split_and_send(update.message, message)
-
-    # Generate and send chart
-    update.message.chat.send_action("upload_photo")
-    chart_buf = generate_ratings_chart(top_props, f"Top {limit} Properties - Ratings Comparison")
-    update.message.reply_photo(photo=chart_buf, caption=f"📊 Top {limit} Properties Rating Chart")
+    await _do_top20(update.message)
 
 
-def property_handler(update, context):
+async def property_handler(update, context):
     args = context.args
     if not args:
-        update.message.reply_text("Usage: /property <id>\nExample: /property 1")
+        await update.message.reply_text("Usage: /property <id>\nExample: /property 1")
         return
     prop_id = args[0]
-    update.message.chat.send_action("typing")
-    p = fetch_property_by_id(prop_id)
+    await update.message.chat.send_action("typing")
+    p = await fetch_property_by_id(prop_id)
     if not p:
-        update.message.reply_text(f"Property with id {prop_id} not found.")
+        await update.message.reply_text(f"Property with id {prop_id} not found.")
         return
-    update.message.reply_text(format_property(p))
+    await update.message.reply_text(format_property(p))
 
 
-def properties_handler(update, context):
+async def properties_handler(update, context):
     """List all properties (basic info)."""
-    update.message.chat.send_action("typing")
-    props = fetch_properties_list()
-    if not props:
-        update.message.reply_text("No properties available.")
-        return
-
-    lines = ["🏠 Properties List\n"]
-    for p in props:
-        lines.append(format_property_basic(p))
+    await _do_properties(update.message)
 
-    lines.append("\n💡 Use /property <id> for details")
-    lines.append("💡 Use /complaints <id> to see complaints")
-    message = "\n".join(lines)
-    split_and_send(update.message, message)
 
-
-def complaints_handler(update, context):
+async def complaints_handler(update, context):
     """Show complaints for a specific property."""
     args = context.args
     if not args:
-        update.message.reply_text(
+        await update.message.reply_text(
             "Usage: /complaints <property_id>\n"
             "Example: /complaints 1\n\n"
             "This will show all complaints for the specified property."
@@ -463,150 +660,111 @@ def complaints_handler(update, context):
         return
 
     if not COMPLAINTS_URL:
-        update.message.reply_text(
+        await update.message.reply_text(
             "Complaints feature is not configured.\n"
             "Please set COMPLAINTS_URL in environment variables."
         )
         return
 
     prop_id = args[0]
-    update.message.chat.send_action("typing")
-
-    # First verify the property exists
-    prop = fetch_property_by_id(prop_id)
-    if not prop:
-        update.message.reply_text(f"Property with id {prop_id} not found.")
-        return
+    await update.message.chat.send_action("typing")
 
-    complaints = fetch_complaints_for_property(prop_id)
-    prop_name = prop.get("name", f"Property {prop_id}")
+    # No separate existence check: the name comes from the (usually cached) properties list,
+    # fetched concurrently with the complaints on a cache miss
+    props, complaints = await asyncio.gather(
+        fetch_all_properties(),
+        fetch_complaints_for_property(prop_id),
+    )
+    prop_name = next(
+        (p.get("name", f"Property {prop_id}") for p in props if str(p.get("id")) == prop_id),
+        f"Property {prop_id}",
+    )
 
     if not complaints:
-        update.message.reply_text(f"No complaints found for {prop_name} (id: {prop_id}).")
+        await update.message.reply_text(f"No complaints found for {prop_name} (id: {prop_id}).")
         return
 
-    lines = [f"📋 Complaints for {prop_name} (id: {prop_id})\n"]
-    lines.append(f"Total: {len(complaints)} complaint(s)\n")
-    for c in complaints:
-        lines.append(format_complaint(c))
-        lines.append("")  # blank line between complaints
+    message = (
+        f"📋 Complaints for {prop_name} (id: {prop_id})\n\n"
+        f"Total: {len(complaints)} complaint(s)\n\n"
+        # blank line between complaints
+        + "\n\n".join(format_complaint(c) for c in complaints)
+        + "\n"
+    )
+    await split_and_send(update.message, message)
+
 
-    message = "\n".join(lines)
-    split_and_send(update.message, message)
+async def refresh_handler(update, context):
+    """Drop cached MockAPI responses (admins only)."""
+    user = update.effective_user
+    if user is None or user.id not in ADMIN_IDS:
+        await update.message.reply_text("This command is only available to admins.")
+        return
+    _CACHE.clear()
+    _CHART_CACHE.clear()
+    logger.info("User %s cleared the MockAPI cache", user.id)
+    await update.message.reply_text("🔄 Cache cleared. Next request will fetch fresh data.")
 
 
-def button_callback_handler(update, context):
+async def button_callback_handler(update, context):
     """Handle inline keyboard button presses."""
     query = update.callback_query
-    query.answer()
-
-    action = query.data
-
-    if action == "action_top5":
-        query.message.chat.send_action("typing")
-        props = fetch_all_properties()
-        if not props:
-            query.message.reply_text("No property data available.")
-            return
-        top_props = get_top_rated_properties(props, 5)
-        if not top_props:
-            query.message.reply_text("Could not calculate ratings.")
-            return
-        lines = ["🏆 Top 5 Best Rated Properties\n"]
-        for rank, (p, avg) in enumerate(top_props, 1):
-            lines.append(format_top_property(rank, p, avg))
-        query.message.reply_text("\n".join(lines))
-        query.message.chat.send_action("upload_photo")
-        chart_buf = generate_ratings_chart(top_props, "Top 5 Properties - Ratings Comparison")
-        query.message.reply_photo(photo=chart_buf, caption="📊 Top 5 Properties Rating Chart")
-
-    elif action == "action_top20":
-        query.message.chat.send_action("typing")
-        props = fetch_all_properties()
-        if not props:
-            query.message.reply_text("No property data available.")
-            return
-        limit = min(20, len(props))
-        top_props = get_top_rated_properties(props, limit)
-        if not top_props:
-            query.message.reply_text("Could not calculate ratings.")
-            return
-        lines = [f"🏆 Top {limit} Best Rated Properties\n"]
-        for rank, (p, avg) in enumerate(top_props, 1):
-            lines.append(format_top_property(rank, p, avg))
-        split_and_send(query.message, "\n".join(lines))
-        query.message.chat.send_action("upload_photo")
-        chart_buf = generate_ratings_chart(top_props, f"Top {limit} Properties - Ratings Comparison")
-        query.message.reply_photo(photo=chart_buf, caption=f"📊 Top {limit} Properties Rating Chart")
-
-    elif action == "action_ratings":
-        query.message.chat.send_action("typing")
-        props = fetch_all_properties()
-        if not props:
-            query.message.reply_text("No property data available.")
-            return
-        lines = ["🏡 Property Ratings\n"]
-        for p in props:
-            lines.append(format_property(p))
-        message = "\n".join(lines)
-        split_and_send(query.message, message)
-
-    elif action == "action_properties":
-        query.message.chat.send_action("typing")
-        props = fetch_properties_list()
-        if not props:
-            query.message.reply_text("No properties available.")
-            return
-        lines = ["🏠 Properties List\n"]
-        for p in props:
-            lines.append(format_property_basic(p))
-        lines.append("\n💡 Use /property <id> for details")
-        message = "\n".join(lines)
-        split_and_send(query.message, message)
-
-    elif action == "action_property_help":
-        query.message.reply_text(
-            "🔍 Property Details\n\n"
-            "To view details for a specific property, use:\n"
-            "/property <id>\n\n"
-            "Example: /property 1"
-        )
+    await query.answer()
 
-    elif action == "action_complaints_help":
-        query.message.reply_text(
-            "📋 View Complaints\n\n"
-            "To see complaints for a specific property, use:\n"
-            "/complaints <property_id>\n\n"
-            "Example: /complaints 1"
-        )
+    handler = CALLBACK_ACTIONS.get(query.data)
+    if handler:
+        await handler(query.message)
 
 
-def error_handler(update, context):
+async def error_handler(update, context):
     logger.error("Update caused error: %s", context.error)
 
 
 def main():
-    updater = Updater(TELEGRAM_TOKEN, use_context=True)
-    dp = updater.dispatcher
+    application = (
+        Application.builder()
+        .token(TELEGRAM_TOKEN)
+        .concurrent_updates(True)
+        # Throttles every Bot API call (replies, photos, chat actions) to Telegram's flood limits
+        .rate_limiter(AIORateLimiter())
+        # Enough Bot API connections for concurrent replies; getUpdates keeps its own small pool
+        .connection_pool_size(32)
+        .get_updates_connection_pool_size(4)
+        .pool_timeout(30)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
 
     # Command handlers
-    dp.add_handler(CommandHandler("start", start))
-    dp.add_handler(CommandHandler("menu", menu_handler))
-    dp.add_handler(CommandHandler("ratings", ratings_handler))
-    dp.add_handler(CommandHandler("top5", top5_handler))
-    dp.add_handler(CommandHandler("top20", top20_handler))
-    dp.add_handler(CommandHandler("properties", properties_handler))
-    dp.add_handler(CommandHandler("property", property_handler, pass_args=True))
-    dp.add_handler(CommandHandler("complaints", complaints_handler, pass_args=True))
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("menu", menu_handler))
+    application.add_handler(CommandHandler("ratings", ratings_handler))
+    application.add_handler(CommandHandler("top5", top5_handler))
+    application.add_handler(CommandHandler("top20", top20_handler))
+    application.add_handler(CommandHandler("properties", properties_handler))
+    application.add_handler(CommandHandler("property", property_handler))
+    application.add_handler(CommandHandler("complaints", complaints_handler))
+    application.add_handler(CommandHandler("refresh", refresh_handler))
 
     # Callback handler for inline keyboard buttons
-    dp.add_handler(CallbackQueryHandler(button_callback_handler))
-
-    dp.add_error_handler(error_handler)
-
-    logger.info("Starting bot...")
-    updater.start_polling()
-    updater.idle()
+    application.add_handler(CallbackQueryHandler(button_callback_handler))
+
+    application.add_error_handler(error_handler)
+
+    if WEBHOOK_URL:
+        # Telegram pushes updates to us, so no long-poll connection is held open
+        logger.info("Starting bot (webhook on %s:%s)...", WEBHOOK_LISTEN, WEBHOOK_PORT)
+        application.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=TELEGRAM_TOKEN,
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{TELEGRAM_TOKEN}",
+            secret_token=WEBHOOK_SECRET,
+        )
+    else:
+        logger.info("Starting bot (polling)...")
+        application.run_polling()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,54 @@
+import os
+import sys
+
+os.environ.setdefault("TELEGRAM_TOKEN", "123:test")
+os.environ.setdefault("MOCKAPI_URL", "https://example.invalid/properties")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bot  # noqa: E402
+
+
+def _stable_top_ids(props, limit):
+    table = bot.build_ratings_table(props)
+    order = sorted(range(len(props)), key=lambda i: -table.avg[i])
+    return [props[i]["id"] for i in order[:limit]]
+
+
+def test_top_rated_ties_at_cutoff_keep_list_order():
+    # Averages repeat in blocks (5, 4.5, 4, 3.5), so the top-20 cutoff falls inside a tie
+    props = [
+        {"id": str(i), "airbnb_rating": 5 - (i % 4) * 0.5, "booking_rating": 5 - (i % 4) * 0.5}
+        for i in range(40)
+    ]
+    table = bot.build_ratings_table(props)
+    for limit in (1, 5, 12, 20, 39, 40):
+        top = bot.get_top_rated_properties(table, limit)
+        assert [p["id"] for p in top.props] == _stable_top_ids(props, limit)
+
+
+def test_top_rated_missing_ratings_average_to_zero():
+    props = [{"id": "a"}, {"id": "b", "airbnb": "bad", "booking": 3}, {"id": "c", "airbnb_rating": 4}]
+    top = bot.get_top_rated_properties(bot.build_ratings_table(props), 3)
+    assert [p["id"] for p in top.props] == ["c", "b", "a"]
+    assert list(top.avg) == [4.0, 3.0, 0.0]
+
+
+def test_ratings_table_follows_properties_cache(monkeypatch):
+    import asyncio
+
+    lists = [[{"id": "1", "airbnb_rating": 1}], [{"id": "1", "airbnb_rating": 3}]]
+    current = {"props": lists[0]}
+
+    async def fake_fetch_all_properties():
+        return current["props"]
+
+    monkeypatch.setattr(bot, "fetch_all_properties", fake_fetch_all_properties)
+    monkeypatch.setattr(bot, "_RATINGS_TABLE", None)
+
+    first = asyncio.run(bot.fetch_ratings_table())
+    assert asyncio.run(bot.fetch_ratings_table()) is first
+    assert list(first.avg) == [1.0]
+
+    # A fresh list (e.g. after the properties TTL expires) must rebuild the table
+    current["props"] = lists[1]
+    assert list(asyncio.run(bot.fetch_ratings_table()).avg) == [3.0]